@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 import os
 import re
-import json
 import time
+import hmac
+import hashlib
+import functools
+import asyncio
 import signal
 import logging
+import shutil
+import tempfile
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Optional
+from urllib.parse import parse_qs
+from typing import Callable, Dict, Any, List, Set, Tuple, Optional
 from datetime import datetime
-import requests
+import httpx
+import orjson
+
+from diff import build_snapshot, detect_changes, select_detectors
 
 # -------------------------
 # Configuration via ENV
@@ -26,7 +35,18 @@ GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "").strip()
 GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com")
 
 POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "300"))
+# Back off quiet repos up to this many seconds between checks (0 = always POLL_INTERVAL)
+MAX_POLL_INTERVAL = int(os.getenv("MAX_POLL_INTERVAL", "0"))
 ONLY_LATEST = os.getenv("ONLY_LATEST", "false").lower() in {"1","true","yes"}
+# Number of release pages to follow via the Link header (each page has its own ETag)
+MAX_PAGES = max(1, int(os.getenv("MAX_PAGES", "1")))
+# Fetch releases via the GraphQL API (only the fields the bot uses); requires GITHUB_TOKEN
+USE_GRAPHQL = os.getenv("USE_GRAPHQL", "false").lower() in {"1","true","yes"}
+# GitHub Enterprise serves REST at <host>/api/v3 and GraphQL at <host>/api/graphql
+_default_graphql_url = (GITHUB_API_BASE.rstrip("/")[:-len("/v3")] + "/graphql"
+                        if GITHUB_API_BASE.rstrip("/").endswith("/api/v3")
+                        else GITHUB_API_BASE.rstrip("/") + "/graphql")
+GITHUB_GRAPHQL_URL = os.getenv("GITHUB_GRAPHQL_URL", "").strip() or _default_graphql_url
 INCLUDE_PRERELEASE = os.getenv("INCLUDE_PRERELEASE", "true").lower() in {"1","true","yes"}
 INCLUDE_DRAFT = os.getenv("INCLUDE_DRAFT", "false").lower() in {"1","true","yes"}
 
@@ -40,6 +60,14 @@ SKIP_EXISTING_ON_INIT = os.getenv("SKIP_EXISTING_ON_INIT", "true").lower() in {"
 
 TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "20"))
 STATE_DIR = Path(os.getenv("STATE_DIR", "./state"))
+# Write indented state files (for manual inspection); compact by default
+STATE_PRETTY = os.getenv("STATE_PRETTY", "false").lower() in {"1","true","yes"}
+# State file format: json (default) or msgpack (smaller and faster, needs the msgpack package)
+STATE_FORMAT = os.getenv("STATE_FORMAT", "json").strip().lower()
+# With STATE_FORMAT=msgpack: additionally write a readable JSON copy of each state file
+DEBUG_JSON_DUMP = os.getenv("DEBUG_JSON_DUMP", "false").lower() in {"1","true","yes"}
+# Checks without release changes (only new ETags) write the state file every N checks and on exit
+STATE_SAVE_CYCLES = max(1, int(os.getenv("STATE_SAVE_CYCLES", "10")))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
 # Logging configuration
@@ -52,7 +80,39 @@ LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 POSTGRES_DSN = os.getenv("POSTGRES_DSN", "").strip()
 POSTGRES_TABLE = os.getenv("POSTGRES_TABLE", "gh_watcher_logs")
 
-SESSION = requests.Session()
+# GitHub webhook listener (optional, needs aiohttp): check a repo as soon as a release event arrives
+WEBHOOK_LISTEN_PORT = int(os.getenv("WEBHOOK_LISTEN_PORT", "0"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "").strip()
+
+# Clients for the whole run: HTTP/2 multiplexes requests to the same host over one
+# TLS connection, and the connection is kept alive across poll cycles.
+# The GitHub client carries the static headers (incl. the token), so they never reach Discord.
+_GITHUB_HEADERS = {"Accept": "application/vnd.github+json", "User-Agent": "gh-release-discord-bot"}
+if GITHUB_TOKEN:
+    _GITHUB_HEADERS["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+# httpx drops idle connections after 5s by default, i.e. between every two poll cycles;
+# keep them for a whole interval (the server may still close them, then httpx reconnects)
+_LIMITS = httpx.Limits(
+    max_connections=20,
+    max_keepalive_connections=10,
+    keepalive_expiry=POLL_INTERVAL + TIMEOUT if POLL_INTERVAL > 0 else 5.0,
+)
+# Renamed or transferred repos answer 301; follow it like requests did
+GITHUB_SESSION = httpx.AsyncClient(http2=True, timeout=TIMEOUT, headers=_GITHUB_HEADERS, limits=_LIMITS,
+                                   follow_redirects=True)
+SESSION = httpx.AsyncClient(http2=True, timeout=TIMEOUT, limits=_LIMITS)
+
+# Cap concurrent GitHub API requests per poll cycle
+GITHUB_CONCURRENCY = max(1, int(os.getenv("ASYNC_CONCURRENCY", "8")))
+github_sem = asyncio.Semaphore(GITHUB_CONCURRENCY)
+
+# Discord webhook message limits
+DISCORD_MAX_EMBEDS = 10
+DISCORD_MAX_CONTENT = 1900
+# Discord webhook rate limit: 5 requests per 2 seconds
+DISCORD_RATE = 2.5
+DISCORD_BURST = 5
+DISCORD_MAX_ATTEMPTS = 3
 
 # Setup logging
 log = logging.getLogger("gh-release-bot")
@@ -90,6 +150,7 @@ pg_conn = None
 if POSTGRES_DSN:
     try:
         import psycopg2
+        import psycopg2.extras
         pg_conn = psycopg2.connect(POSTGRES_DSN)
         pg_conn.autocommit = True
         
@@ -111,264 +172,740 @@ if POSTGRES_DSN:
             """)
             cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name_for_idx}_timestamp ON {POSTGRES_TABLE}(timestamp)")
             cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name_for_idx}_repo ON {POSTGRES_TABLE}(repo)")
+            # Parse and plan the log INSERT once per connection
+            cur.execute(f"""
+                PREPARE gh_ins_stmt (varchar, varchar, varchar, text, jsonb) AS
+                INSERT INTO {POSTGRES_TABLE} (log_level, repo, event_type, message, data)
+                VALUES ($1, $2, $3, $4, $5)
+            """)
+        # Log rows are buffered and written in one transaction per flush
+        pg_conn.autocommit = False
         log.info("PostgreSQL logging enabled: %s", POSTGRES_TABLE)
     except Exception as e:
         log.warning("PostgreSQL connection failed (continuing without DB logging): %s", e)
         pg_conn = None
 
+# MessagePack state files (optional)
+msgpack = None
+if STATE_FORMAT == "msgpack":
+    try:
+        import msgpack
+        log.info("MessagePack state files enabled")
+    except ImportError as e:
+        log.warning("msgpack not available (continuing with JSON state files): %s", e)
+        msgpack = None
+STATE_SUFFIX = ".msgpack" if msgpack else ".json"
+
+if USE_GRAPHQL and not GITHUB_TOKEN:
+    log.warning("USE_GRAPHQL needs a GITHUB_TOKEN (continuing with the REST API)")
+elif USE_GRAPHQL and ONLY_LATEST:
+    log.warning("USE_GRAPHQL is ignored with ONLY_LATEST (continuing with the REST API)")
+
 inc_re = re.compile(ASSET_NAME_INCLUDE) if ASSET_NAME_INCLUDE else None
 exc_re = re.compile(ASSET_NAME_EXCLUDE) if ASSET_NAME_EXCLUDE else None
 
-shutdown = False
-def _sig_handler(signum, frame):
-    global shutdown
-    shutdown = True
-signal.signal(signal.SIGTERM, _sig_handler)
-signal.signal(signal.SIGINT, _sig_handler)
+def _literal_alternatives(pattern: str) -> Optional[Tuple[str, ...]]:
+    """The plain strings of a pattern like 'linux|darwin' or '\\.deb', or None if it uses other regex syntax"""
+    alternatives = []
+    for alt in pattern.split("|"):
+        chars: List[str] = []
+        escaped = False
+        for ch in alt:
+            if escaped:
+                if ch.isalnum() or ch == "_":
+                    return None  # \d, \b, \1, ...
+                chars.append(ch)
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch in ".^$*+?{}[]()":
+                return None
+            else:
+                chars.append(ch)
+        if escaped or not chars:
+            return None
+        alternatives.append("".join(chars))
+    return tuple(alternatives)
+
+def _contains_any(literals: Tuple[str, ...]) -> Callable[[str], bool]:
+    def contains(name: str) -> bool:
+        for lit in literals:
+            if lit in name:
+                return True
+        return False
+    return contains
+
+def _build_asset_filter() -> Callable[[str], Any]:
+    """Return one callable deciding whether an asset name passes the include/exclude filters"""
+    inc_lits = _literal_alternatives(ASSET_NAME_INCLUDE) if inc_re else None
+    exc_lits = _literal_alternatives(ASSET_NAME_EXCLUDE) if exc_re else None
+    if inc_lits or exc_lits:
+        # Plain substring lists (the common case) are checked with `in`, several times faster than re
+        inc = _contains_any(inc_lits) if inc_lits else inc_re.search if inc_re else None
+        exc = _contains_any(exc_lits) if exc_lits else exc_re.search if exc_re else None
+        if inc and exc:
+            return lambda name: not exc(name) and bool(inc(name))
+        if inc:
+            return inc
+        return lambda name: not exc(name)
+    if inc_re and exc_re:
+        if not inc_re.groups:
+            # Both filters in one pattern, so each name is scanned by a single regex call
+            try:
+                return re.compile(
+                    f"(?=.*?(?:{ASSET_NAME_INCLUDE}))(?!.*?(?:{ASSET_NAME_EXCLUDE}))", re.DOTALL
+                ).match
+            except re.error:
+                pass
+        return lambda name: inc_re.search(name) is not None and exc_re.search(name) is None
+    if inc_re:
+        return inc_re.search
+    if exc_re:
+        return lambda name: exc_re.search(name) is None
+    return lambda name: True
+
+_asset_filter = _build_asset_filter()
+
+@functools.lru_cache(maxsize=4096)
+def _cached_asset_filter(name: str) -> bool:
+    return bool(_asset_filter(name))
+
+# Asset names repeat in every changed response: with filters set, run the regexes once per name.
+# None without filters, so build_snapshot uses its unfiltered loop.
+_asset_allowed = _cached_asset_filter if inc_re or exc_re else None
+
+# Change detectors for the event types in NOTIFY_ON
+DETECTORS = select_detectors(NOTIFY_ON)
+
+# Settings that change the snapshot built from an identical response body
+_SNAPSHOT_SETTINGS = f"{INCLUDE_DRAFT}|{INCLUDE_PRERELEASE}|{ASSET_NAME_INCLUDE}|{ASSET_NAME_EXCLUDE}".encode()
+
+_shutdown_evt = asyncio.Event()
+def _sig_handler() -> None:
+    _shutdown_evt.set()
 
 # -------------------------
 # Helpers
 # -------------------------
-def _headers(etag: Optional[str] = None) -> Dict[str, str]:
-    h = {"Accept": "application/vnd.github+json", "User-Agent": "gh-release-discord-bot"}
-    if GITHUB_TOKEN:
-        h["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+def _headers(etag: Optional[str] = None, last_modified: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """Conditional request headers; merged with the GitHub client's static headers"""
+    if not etag and not last_modified:
+        return None
+    h = {}
     if etag:
         h["If-None-Match"] = etag
+    if last_modified:
+        # Fallback validator for responses that come without an ETag
+        h["If-Modified-Since"] = last_modified
     return h
 
-def _state_path(repo: str) -> Path:
-    return STATE_DIR / f"{repo.replace('/', '__')}.json"
+def _releases_url(repo: str) -> str:
+    url = f"{GITHUB_API_BASE}/repos/{repo}/releases"
+    if ONLY_LATEST:
+        url += "/latest"
+    return url
+
+@functools.lru_cache(maxsize=None)
+def _state_path(repo: str, suffix: str = STATE_SUFFIX) -> Path:
+    return STATE_DIR / f"{repo.replace('/', '__')}{suffix}"
+
+def _encode_state(state: Dict[str, Any]) -> bytes:
+    if msgpack:
+        return msgpack.packb(state, use_bin_type=True)
+    return orjson.dumps(state, option=orjson.OPT_INDENT_2 if STATE_PRETTY else 0)
+
+def _decode_state(data: bytes) -> Dict[str, Any]:
+    if msgpack:
+        return msgpack.unpackb(data, raw=False)
+    return orjson.loads(data)
+
+# Process umask, applied to state files (temp files are created with mode 0600)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _split_release(rel: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a release stored with nested asset dicts into the metadata/download count layout"""
+    assets = rel.get("assets") or {}
+    meta = {k: v for k, v in rel.items() if k not in ("id", "assets")}
+    meta["assets"] = {
+        asset_id: {"name": a.get("name"), "browser_download_url": a.get("browser_download_url")}
+        for asset_id, a in assets.items()
+    }
+    return {"meta": meta, "dl": {asset_id: int(a.get("download_count", 0)) for asset_id, a in assets.items()}}
+
+def _upgrade_state(repo: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert state files written by older versions to the current layout"""
+    releases = state.get("releases") or {}
+    for rel_id, rel in releases.items():
+        if "meta" not in rel:
+            releases[rel_id] = _split_release(rel)
+    # A single ETag/body hash becomes the validators of the first page
+    if "pages" not in state:
+        etag = state.pop("etag", None)
+        old_hash = state.pop("body_hash", None)
+        state["pages"] = {}
+        if etag or old_hash:
+            state["pages"][_releases_url(repo)] = {
+                "etag": etag,
+                "last_modified": None,
+                "next": None,
+                "hash": old_hash,
+                "ids": list(state.get("releases", {})),
+            }
+    return state
+
+# Last written state file content per repo, to skip rewriting unchanged state
+_last_saved: Dict[str, bytes] = {}
+
+def _read(path: Path) -> Optional[bytes]:
+    """File contents, or None if it does not exist (one open instead of stat + open)"""
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
 
 def load_state(repo: str) -> Dict[str, Any]:
     p = _state_path(repo)
-    if p.exists():
+    data = _read(p)
+    if data is not None:
         try:
-            return json.loads(p.read_text(encoding="utf-8"))
-        except Exception:
-            pass
-    return {"etag": None, "releases": {}}
+            state = _decode_state(data)
+            _last_saved[repo] = data
+            return _upgrade_state(repo, state)
+        except Exception as e:
+            log.error("[%s] State file %s is corrupt: %s", repo, p, e)
+        bak = _state_path(repo, STATE_SUFFIX + ".bak")
+        try:
+            bak_data = _read(bak)
+            if bak_data is not None:
+                state = _upgrade_state(repo, _decode_state(bak_data))
+                log.warning("[%s] Restored state from backup %s", repo, bak)
+                return state
+        except Exception as e:
+            log.error("[%s] State backup %s is corrupt: %s", repo, bak, e)
+    elif msgpack:
+        # One-time migration of an existing JSON state file
+        legacy = _state_path(repo, ".json")
+        try:
+            legacy_data = _read(legacy)
+            if legacy_data is not None:
+                state = orjson.loads(legacy_data)
+                log.info("[%s] Migrating JSON state file to MessagePack", repo)
+                return _upgrade_state(repo, state)
+        except Exception as e:
+            log.error("[%s] Legacy state file %s is corrupt: %s", repo, legacy, e)
+    return {"pages": {}, "releases": {}}
+
+# In-memory state per repo: the source of truth while the bot runs, read from disk only once
+_STATES: Dict[str, Dict[str, Any]] = {}
+
+def get_state(repo: str) -> Dict[str, Any]:
+    state = _STATES.get(repo)
+    if state is None:
+        state = _STATES[repo] = load_state(repo)
+    return state
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """Write to a temp file next to path and rename it over path, so a crash never leaves a truncated file"""
+    tmp = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False)
+    try:
+        with tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        # os.chmod by name: os.fchmod is missing on Windows before Python 3.13
+        os.chmod(tmp.name, 0o666 & ~_UMASK)
+        os.replace(tmp.name, path)
+    except BaseException:
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
 
-def save_state(repo: str, state: Dict[str, Any]) -> None:
+# Deferred (validator-only) saves per repo since the last write
+_deferred: Dict[str, int] = {}
+
+def save_state(repo: str, state: Dict[str, Any], defer: bool = False) -> None:
+    if defer:
+        _deferred[repo] = _deferred.get(repo, 0) + 1
+        if _deferred[repo] < STATE_SAVE_CYCLES:
+            return
+    _deferred.pop(repo, None)
+    data = _encode_state(state)
+    if _last_saved.get(repo) == data:
+        log.debug("[%s] State unchanged, skipping write", repo)
+        return
     STATE_DIR.mkdir(parents=True, exist_ok=True)
-    _state_path(repo).write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    path = _state_path(repo)
+    if repo in _last_saved and path.exists():
+        # Keep the previous (known good) version as a backup: a hard link costs no copy
+        bak = _state_path(repo, STATE_SUFFIX + ".bak")
+        bak.unlink(missing_ok=True)
+        try:
+            os.link(path, bak)
+        except OSError:
+            shutil.copy2(path, bak)
+    _atomic_write(path, data)
+    _last_saved[repo] = data
+    if msgpack and DEBUG_JSON_DUMP:
+        _state_path(repo, ".debug.json").write_bytes(orjson.dumps(state, option=orjson.OPT_INDENT_2))
+
+def flush_states() -> None:
+    """Write all state files with deferred saves"""
+    for repo in list(_deferred):
+        try:
+            save_state(repo, _STATES[repo])
+        except Exception as e:
+            log.error("[%s] Failed to save state: %s", repo, e)
+
+# Log rows waiting to be written to PostgreSQL
+_pg_buffer: List[Tuple[str, str, str, str, Optional[str]]] = []
 
 def log_to_postgres(repo: str, event_type: str, log_level: str, message: str, data: Optional[Dict[str, Any]] = None) -> None:
-    """Log event to PostgreSQL database if configured"""
+    """Queue event for the PostgreSQL log if configured (written by _pg_flush)"""
     if not pg_conn:
         return
-    
+    # Serialized with orjson up front; the prepared statement casts the text to jsonb
+    _pg_buffer.append((log_level, repo, event_type, message, orjson.dumps(data).decode() if data else None))
+
+def _pg_flush() -> None:
+    """Write all queued log rows through the prepared INSERT in a single transaction"""
+    if not pg_conn or not _pg_buffer:
+        return
+    rows = _pg_buffer[:]
+    _pg_buffer.clear()
     try:
         with pg_conn.cursor() as cur:
-            cur.execute(
-                f"""
-                INSERT INTO {POSTGRES_TABLE} (log_level, repo, event_type, message, data)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                (log_level, repo, event_type, message, json.dumps(data) if data else None)
-            )
-        log.debug("PostgreSQL log written: %s - %s", repo, event_type)
+            # execute_batch sends up to 100 EXECUTEs per round trip
+            psycopg2.extras.execute_batch(cur, "EXECUTE gh_ins_stmt (%s, %s, %s, %s, %s)", rows)
+        pg_conn.commit()
+        log.debug("PostgreSQL: %d log row(s) written", len(rows))
     except Exception as e:
         log.error("Failed to log to PostgreSQL: %s | Query would be: INSERT INTO %s ...", e, POSTGRES_TABLE)
         import traceback
         log.error("Traceback: %s", traceback.format_exc())
+        try:
+            pg_conn.rollback()
+        except Exception:
+            pass
 
-def fetch_releases(repo: str, etag: Optional[str]) -> Tuple[int, Any, Optional[str], Optional[requests.Response]]:
-    url = f"{GITHUB_API_BASE}/repos/{repo}/releases"
-    if ONLY_LATEST:
-        url += "/latest"
-    resp = SESSION.get(url, headers=_headers(etag), timeout=TIMEOUT)
-    new_etag = resp.headers.get("ETag")
+def body_hash(body: bytes) -> str:
+    """Hash of a releases response body, combined with the settings that shape the snapshot"""
+    h = hashlib.blake2b(_SNAPSHOT_SETTINGS, digest_size=16)
+    h.update(body)
+    return h.hexdigest()
+
+class ShutdownRequested(Exception):
+    """Raised instead of sending a queued GitHub request once shutdown has been requested"""
+
+def _check_shutdown() -> None:
+    # Checks of one cycle start together and then queue on github_sem; don't send the queued requests
+    if _shutdown_evt.is_set():
+        raise ShutdownRequested()
+
+async def fetch_page(url: str, old_page: Dict[str, Any]) -> Dict[str, Any]:
+    """Conditionally fetch one releases page; body and hash are None when it was not modified"""
+    async with github_sem:
+        _check_shutdown()
+        resp = await GITHUB_SESSION.get(url, headers=_headers(old_page.get("etag"), old_page.get("last_modified")))
     if resp.status_code == 304:
-        return 304, None, new_etag, resp
-    if resp.status_code >= 400:
-        raise requests.HTTPError(f"{resp.status_code} {resp.text}", response=resp)
-    return resp.status_code, resp.json(), new_etag, resp
-
-def summarize_release(rel: Dict[str, Any]) -> Dict[str, Any]:
-    assets = rel.get("assets", []) or []
-    asset_info = {}
-    for a in assets:
-        name = a.get("name") or ""
-        if inc_re and not inc_re.search(name):
-            continue
-        if exc_re and exc_re.search(name):
-            continue
-        asset_info[str(a["id"])] = {
-            "name": name,
-            "download_count": int(a.get("download_count", 0)),
-            "browser_download_url": a.get("browser_download_url"),
+        return {
+            "status": 304,
+            "body": None,
+            "hash": None,
+            "etag": resp.headers.get("ETag") or old_page.get("etag"),
+            "last_modified": resp.headers.get("Last-Modified") or old_page.get("last_modified"),
+            "next": old_page.get("next"),
         }
+    if resp.status_code != 200:
+        raise httpx.HTTPStatusError(f"{resp.status_code} {resp.text}", request=resp.request, response=resp)
     return {
-        "id": rel.get("id"),
-        "tag_name": rel.get("tag_name"),
-        "name": rel.get("name"),
-        "draft": rel.get("draft"),
-        "prerelease": rel.get("prerelease"),
-        "html_url": rel.get("html_url"),
-        "published_at": rel.get("published_at"),
-        "assets": asset_info,
+        "status": resp.status_code,
+        "body": resp.content,
+        "hash": body_hash(resp.content),
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "next": resp.links.get("next", {}).get("url"),
     }
 
-def build_snapshot(api_data: Any) -> Dict[str, Any]:
-    if isinstance(api_data, dict) and "id" in api_data:
-        rels = [api_data]
-    else:
-        rels = api_data or []
-    snapshot = {}
-    for rel in rels:
-        if not INCLUDE_DRAFT and rel.get("draft"):
-            continue
-        if not INCLUDE_PRERELEASE and rel.get("prerelease"):
-            continue
-        s = summarize_release(rel)
-        snapshot[str(s["id"])] = s
-    return snapshot
-
-def detect_changes(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
-    events = []
-    old_rels = old.get("releases", {})
-
-    if "new_release" in NOTIFY_ON:
-        for rel_id, rel in new.items():
-            if rel_id not in old_rels:
-                events.append({"type": "new_release", "release": rel})
-
-    if "new_asset" in NOTIFY_ON:
-        for rel_id, rel in new.items():
-            old_rel = old_rels.get(rel_id)
-            if not old_rel:
-                continue
-            for asset_id, asset in rel["assets"].items():
-                if asset_id not in (old_rel.get("assets") or {}):
-                    events.append({"type": "new_asset", "release": rel, "asset": asset})
-
-    if "dl_increase" in NOTIFY_ON:
-        for rel_id, rel in new.items():
-            old_rel = old_rels.get(rel_id)
-            for asset_id, asset in rel["assets"].items():
-                old_asset = (old_rel.get("assets") or {}).get(asset_id) if old_rel else None
-                
-                # Determine old download count (0 if asset or release is new)
-                old_dl = int(old_asset.get("download_count", 0)) if old_asset else 0
-                new_dl = int(asset.get("download_count", 0))
-                
-                # Report increase if downloads increased (including from 0 for new releases/assets)
-                if new_dl > old_dl:
-                    events.append({
-                        "type": "dl_increase",
-                        "release": rel,
-                        "asset": asset,
-                        "delta": new_dl - old_dl,
-                        "from": old_dl,
-                        "to": new_dl
-                    })
-    return events
-
-def send_discord_text(content: str) -> None:
-    if not DISCORD_WEBHOOK:
-        log.warning("DISCORD_WEBHOOK_URL not set. Logging only: %s", content)
-        return
-    payload: Dict[str, Any] = {"content": content}
-    if DISCORD_USERNAME:
-        payload["username"] = DISCORD_USERNAME
-    if DISCORD_AVATAR_URL:
-        payload["avatar_url"] = DISCORD_AVATAR_URL
-    r = SESSION.post(DISCORD_WEBHOOK, json=payload, timeout=TIMEOUT)
-    r.raise_for_status()
+async def fetch_releases(repo: str, old_pages: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Fetch up to MAX_PAGES release pages, each with its own stored validators"""
+    if USE_GRAPHQL and GITHUB_TOKEN and not ONLY_LATEST:
+        return await fetch_releases_graphql(repo)
+    pages = []
+    url = _releases_url(repo)
+    while url and len(pages) < MAX_PAGES:
+        page = await fetch_page(url, old_pages.get(url) or {})
+        pages.append((url, page))
+        url = page["next"]
+    return pages
 
-def send_discord_embed(title: str, description: str, url: Optional[str] = None, fields: Optional[List[Dict[str,str]]] = None) -> None:
-    if not DISCORD_WEBHOOK:
-        log.warning("DISCORD_WEBHOOK_URL not set. Logging only: %s | %s", title, description)
-        return
+# Same page size as the REST default, so MAX_PAGES means the same in both modes
+_RELEASES_QUERY = """
+query($owner: String!, $name: String!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    releases(first: 30, after: $cursor, orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        id databaseId tagName name isDraft isPrerelease url publishedAt
+        releaseAssets(first: 100) { pageInfo { hasNextPage endCursor } nodes { id name downloadCount downloadUrl } }
+      }
+    }
+  }
+}
+"""
+
+# Follow-up pages for releases with more than 100 assets
+_ASSETS_QUERY = """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on Release {
+      releaseAssets(first: 100, after: $cursor) { pageInfo { hasNextPage endCursor } nodes { id name downloadCount downloadUrl } }
+    }
+  }
+}
+"""
+
+def _graphql_release(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a GraphQL release node to the REST fields build_snapshot reads"""
+    return {
+        "id": node["databaseId"],
+        "tag_name": node.get("tagName"),
+        "name": node.get("name"),
+        "draft": node.get("isDraft"),
+        "prerelease": node.get("isPrerelease"),
+        "html_url": node.get("url"),
+        "published_at": node.get("publishedAt"),
+        "assets": [
+            {
+                "id": a["id"],
+                "name": a.get("name"),
+                "browser_download_url": a.get("downloadUrl"),
+                "download_count": a.get("downloadCount", 0),
+            }
+            for a in (node.get("releaseAssets") or {}).get("nodes") or []
+        ],
+    }
+
+class RateLimitError(Exception):
+    """GitHub rate limit reported in a 200 response (GraphQL RATE_LIMITED errors)"""
+
+    def __init__(self, reset: Optional[str], retry_after: Optional[str]) -> None:
+        super().__init__(f"Rate limit reached. Reset: {reset}")
+        self.reset = reset
+        self.retry_after = retry_after
+
+async def _graphql(query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one GraphQL query and return its data; raises on HTTP, rate limit and query errors"""
+    async with github_sem:
+        _check_shutdown()
+        resp = await GITHUB_SESSION.post(GITHUB_GRAPHQL_URL, content=orjson.dumps({"query": query, "variables": variables}))
+    if resp.status_code != 200:
+        raise httpx.HTTPStatusError(f"{resp.status_code} {resp.text}", request=resp.request, response=resp)
+    data = orjson.loads(resp.content)
+    if data.get("errors"):
+        if any(e.get("type") == "RATE_LIMITED" for e in data["errors"]):
+            raise RateLimitError(resp.headers.get("x-ratelimit-reset"), resp.headers.get("retry-after"))
+        raise RuntimeError("GraphQL error: " + "; ".join(e.get("message", "") for e in data["errors"]))
+    return data.get("data") or {}
+
+async def _fetch_remaining_assets(node: Dict[str, Any]) -> None:
+    """Append the assets beyond the first 100 to a release node"""
+    assets = node["releaseAssets"]
+    while assets["pageInfo"]["hasNextPage"]:
+        data = await _graphql(_ASSETS_QUERY, {"id": node["id"], "cursor": assets["pageInfo"]["endCursor"]})
+        more = (data.get("node") or {}).get("releaseAssets")
+        if more is None:
+            raise RuntimeError(f"GraphQL error: release {node.get('tagName')} not found")
+        assets["nodes"].extend(more["nodes"])
+        assets["pageInfo"] = more["pageInfo"]
+
+async def fetch_page_graphql(repo: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """Fetch one releases page via GraphQL; the body is the REST-shaped JSON of the used fields"""
+    owner, name = repo.split("/", 1)
+    data = await _graphql(_RELEASES_QUERY, {"owner": owner, "name": name, "cursor": cursor})
+    releases = (data.get("repository") or {}).get("releases")
+    if releases is None:
+        raise RuntimeError(f"GraphQL error: repository {repo} not found")
+    for node in releases["nodes"]:
+        if node.get("releaseAssets"):
+            await _fetch_remaining_assets(node)
+    page_info = releases["pageInfo"]
+    body = orjson.dumps([_graphql_release(n) for n in releases["nodes"]])
+    return {
+        "status": 200,
+        "body": body,
+        "hash": body_hash(body),
+        "etag": None,
+        "last_modified": None,
+        "next": page_info["endCursor"] if page_info["hasNextPage"] else None,
+    }
+
+async def fetch_releases_graphql(repo: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Fetch up to MAX_PAGES release pages via GraphQL, keyed by their cursor"""
+    pages = []
+    cursor = None
+    while len(pages) < MAX_PAGES:
+        page = await fetch_page_graphql(repo, cursor)
+        pages.append((f"graphql:{cursor or ''}", page))
+        cursor = page["next"]
+        if not cursor:
+            break
+    return pages
+
+def build_embed(title: str, description: str, url: Optional[str] = None, fields: Optional[List[Dict[str,str]]] = None) -> Dict[str, Any]:
     embed: Dict[str, Any] = {"title": title, "description": description}
     if url:
         embed["url"] = url
     if fields:
         embed["fields"] = fields
-    payload: Dict[str, Any] = {"embeds": [embed]}
+    return embed
+
+def _text_new_release(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    return "content", f"📦 New Release **{repo}**: **{tag}**\n{rel_url}"
+
+def _text_new_asset(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    a = ev["asset"]
+    return "content", f"🆕 New Asset in **{repo} {tag}**: **{a['name']}** → 0 Downloads\n{rel_url}"
+
+def _text_dl_increase(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    a = ev["asset"]
+    return "content", (
+        f"⬇️ Download Increase **{repo} {tag}**: **{a['name']}** "
+        f"(+{ev['delta']}, {ev['from']} → {ev['to']})\n{a.get('browser_download_url') or rel_url}"
+    )
+
+def _text_other(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    return "content", f"ℹ️ {ev['type']} | {repo} {tag}"
+
+def _embed_new_release(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    rel = ev["release"]
+    return "embed", build_embed(
+        title=f"New Release: {repo} {tag}",
+        description=f"Link: {rel_url}",
+        url=rel_url,
+        fields=[
+            {"name":"Prerelease", "value":str(rel.get("prerelease")), "inline": True},
+            {"name":"Draft", "value":str(rel.get("draft")), "inline": True},
+        ],
+    )
+
+def _embed_new_asset(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    a = ev["asset"]
+    return "embed", build_embed(
+        title=f"New Asset: {a['name']}",
+        description=f"Release: {repo} {tag}",
+        url=rel_url,
+        fields=[{"name":"Downloads", "value":"0", "inline": True}]
+    )
+
+def _embed_dl_increase(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    a = ev["asset"]
+    return "embed", build_embed(
+        title=f"Download Increase: {a['name']}",
+        description=f"{repo} {tag}",
+        url=a.get("browser_download_url") or rel_url,
+        fields=[
+            {"name":"Δ", "value":f"+{ev['delta']}", "inline": True},
+            {"name":"from → to", "value":f"{ev['from']} → {ev['to']}", "inline": True}
+        ]
+    )
+
+def _embed_other(repo: str, ev: Dict[str, Any], tag: str, rel_url: str) -> Tuple[str, Any]:
+    return "embed", build_embed(title=f"Event: {ev['type']}", description=f"{repo} {tag}", url=rel_url)
+
+# Formatters per event type, resolved once for the configured output mode
+if USE_EMBEDS:
+    _FORMATTERS = {
+        "new_release": _embed_new_release,
+        "new_asset": _embed_new_asset,
+        "dl_increase": _embed_dl_increase,
+    }
+    _FORMAT_OTHER = _embed_other
+else:
+    _FORMATTERS = {
+        "new_release": _text_new_release,
+        "new_asset": _text_new_asset,
+        "dl_increase": _text_dl_increase,
+    }
+    _FORMAT_OTHER = _text_other
+
+def build_payload(repo: str, ev: Dict[str, Any]) -> Tuple[str, Any]:
+    """Build the Discord payload for an event: ("content", str) or ("embed", dict)"""
+    rel = ev["release"]
+    tag = rel.get("tag_name") or rel.get("name") or "(no name)"
+    return _FORMATTERS.get(ev["type"], _FORMAT_OTHER)(repo, ev, tag, rel.get("html_url", ""))
+
+class TokenBucket:
+    """Spaces out requests to at most `rate` per second, allowing bursts of `burst`"""
+    __slots__ = ("rate", "burst", "tokens", "last", "lock")
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def take(self) -> None:
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 0
+                self.last = time.monotonic()
+            else:
+                self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Hold back the next request for `seconds` (rate limit reported by the server)"""
+        self.tokens = min(self.tokens, 0)
+        self.last = max(self.last, time.monotonic() + seconds)
+
+discord_bucket = TokenBucket(DISCORD_RATE, DISCORD_BURST)
+
+def _float_header(r: httpx.Response, name: str, default: float) -> float:
+    try:
+        return float(r.headers.get(name, default))
+    except ValueError:
+        return default
+
+async def send_discord(payload: Dict[str, Any]) -> None:
     if DISCORD_USERNAME:
         payload["username"] = DISCORD_USERNAME
     if DISCORD_AVATAR_URL:
         payload["avatar_url"] = DISCORD_AVATAR_URL
-    r = SESSION.post(DISCORD_WEBHOOK, json=payload, timeout=TIMEOUT)
-    r.raise_for_status()
+    for attempt in range(1, DISCORD_MAX_ATTEMPTS + 1):
+        await discord_bucket.take()
+        r = await SESSION.post(DISCORD_WEBHOOK, json=payload)
+        if r.headers.get("X-RateLimit-Remaining") == "0":
+            discord_bucket.pause(_float_header(r, "X-RateLimit-Reset-After", 0.0))
+        if r.status_code == 429 and attempt < DISCORD_MAX_ATTEMPTS:
+            retry_after = _float_header(r, "Retry-After", 1.0)
+            log.warning("Discord rate limit, retrying in %.1fs", retry_after)
+            discord_bucket.pause(retry_after)
+            continue
+        r.raise_for_status()
+        return
 
-def format_and_send_event(repo: str, ev: Dict[str, Any]) -> None:
-    rel = ev["release"]
-    tag = rel.get("tag_name") or rel.get("name") or "(no name)"
-    rel_url = rel.get("html_url", "")
-    t = ev["type"]
-
-    if not USE_EMBEDS:
-        if t == "new_release":
-            send_discord_text(f"📦 New Release **{repo}**: **{tag}**\n{rel_url}")
-        elif t == "new_asset":
-            a = ev["asset"]
-            send_discord_text(f"🆕 New Asset in **{repo} {tag}**: **{a['name']}** → 0 Downloads\n{rel_url}")
-        elif t == "dl_increase":
-            a = ev["asset"]
-            send_discord_text(
-                f"⬇️ Download Increase **{repo} {tag}**: **{a['name']}** "
-                f"(+{ev['delta']}, {ev['from']} → {ev['to']})\n{a.get('browser_download_url') or rel_url}"
-            )
+class DiscordQueue:
+    """Collects notifications of one repo and delivers them in as few webhook calls as possible"""
+
+    def __init__(self, repo: str) -> None:
+        self.repo = repo
+        self.contents: List[str] = []
+        self.embeds: List[Dict[str, Any]] = []
+
+    def add(self, kind: str, payload: Any) -> None:
+        if kind == "embed":
+            self.embeds.append(payload)
         else:
-            send_discord_text(f"ℹ️ {t} | {repo} {tag}")
+            self.contents.append(payload)
+
+    def _batches(self) -> List[Dict[str, Any]]:
+        batches: List[Dict[str, Any]] = []
+        # Discord accepts up to 10 embeds per message
+        for i in range(0, len(self.embeds), DISCORD_MAX_EMBEDS):
+            batches.append({"embeds": self.embeds[i:i + DISCORD_MAX_EMBEDS]})
+        # Join text messages up to the content length limit
+        chunk = ""
+        for content in self.contents:
+            if chunk and len(chunk) + 1 + len(content) > DISCORD_MAX_CONTENT:
+                batches.append({"content": chunk})
+                chunk = ""
+            chunk = f"{chunk}\n{content}" if chunk else content
+        if chunk:
+            batches.append({"content": chunk})
+        return batches
+
+    async def flush(self) -> None:
+        batches = self._batches()
+        self.contents.clear()
+        self.embeds.clear()
+        if not batches:
+            return
+        if not DISCORD_WEBHOOK:
+            for payload in batches:
+                log.warning("DISCORD_WEBHOOK_URL not set. Logging only: %s", payload)
+            return
+        log.info("[%s] Sending %d Discord message(s)", self.repo, len(batches))
+        for payload in batches:
+            try:
+                await send_discord(payload)
+            except Exception as ex:
+                log.error("Discord error (%s): %s", self.repo, ex)
+                log_to_postgres(self.repo, "error", "ERROR", f"Discord error: {ex}", {"error": str(ex)})
+
+# A repo can be checked by the poll loop and a webhook at the same time; never run both at once
+_REPO_LOCKS: Dict[str, asyncio.Lock] = {}
+
+def _schedule_next(state: Dict[str, Any], changed: bool) -> None:
+    """Double the check interval of a repo for each quiet check, up to MAX_POLL_INTERVAL"""
+    if not MAX_POLL_INTERVAL > POLL_INTERVAL > 0:
         return
+    quiet = 0 if changed else state.get("quiet_checks", 0) + 1
+    state["quiet_checks"] = quiet
+    state["next_poll_at"] = time.time() + min(POLL_INTERVAL * 2 ** min(quiet, 4), MAX_POLL_INTERVAL)
 
-    if t == "new_release":
-        send_discord_embed(
-            title=f"New Release: {repo} {tag}",
-            description=f"Link: {rel_url}",
-            url=rel_url,
-            fields=[
-                {"name":"Prerelease", "value":str(rel.get("prerelease")), "inline": True},
-                {"name":"Draft", "value":str(rel.get("draft")), "inline": True},
-            ],
-        )
-    elif t == "new_asset":
-        a = ev["asset"]
-        send_discord_embed(
-            title=f"New Asset: {a['name']}",
-            description=f"Release: {repo} {tag}",
-            url=rel_url,
-            fields=[{"name":"Downloads", "value":"0", "inline": True}]
-        )
-    elif t == "dl_increase":
-        a = ev["asset"]
-        send_discord_embed(
-            title=f"Download Increase: {a['name']}",
-            description=f"{repo} {tag}",
-            url=a.get("browser_download_url") or rel_url,
-            fields=[
-                {"name":"Δ", "value":f"+{ev['delta']}", "inline": True},
-                {"name":"from → to", "value":f"{ev['from']} → {ev['to']}", "inline": True}
-            ]
-        )
-    else:
-        send_discord_embed(title=f"Event: {t}", description=f"{repo} {tag}", url=rel_url)
+def _is_due(state: Dict[str, Any]) -> bool:
+    # Half an interval of tolerance, so timing jitter does not push a repo to the next cycle
+    return state.get("next_poll_at", 0) <= time.time() + POLL_INTERVAL / 2
+
+async def process_repo(repo: str, force: bool = False) -> None:
+    async with _REPO_LOCKS.setdefault(repo, asyncio.Lock()):
+        if _shutdown_evt.is_set():
+            # Let a running cycle drain quickly on SIGTERM/SIGINT; checks already in flight finish normally
+            return
+        if not force and not _is_due(get_state(repo)):
+            log.debug("[%s] Skipping check (backoff or rate limit)", repo)
+            return
+        try:
+            await check_repo(repo)
+        except Exception as e:
+            # One failing repo must not end polling for all others
+            import traceback
+            log.error("[%s] Unexpected error during check: %s", repo, e)
+            log.error("Traceback: %s", traceback.format_exc())
+            log_to_postgres(repo, "error", "ERROR", f"Unexpected error: {e}", {"error": str(e)})
+        finally:
+            # One database round trip per check instead of one per log row
+            _pg_flush()
+
+def _rate_limited(repo: str, state: Dict[str, Any], reset: Optional[str], retry_after: Optional[str]) -> None:
+    log.warning("Rate limit for %s. Reset header: %s", repo, reset)
+    log_to_postgres(repo, "rate_limit", "WARNING", f"Rate limit reached. Reset: {reset}", {
+        "reset_time": reset
+    })
+    # Do not check this repo again before the rate limit window resets
+    if retry_after and retry_after.isdigit():
+        state["next_poll_at"] = time.time() + int(retry_after)
+    elif reset and reset.isdigit():
+        state["next_poll_at"] = int(reset)
+    save_state(repo, state, defer=True)
 
-def process_repo(repo: str) -> None:
-    state = load_state(repo)
+async def check_repo(repo: str) -> None:
+    state = get_state(repo)
     is_first_run = not state.get("releases")  # No state = first run
     
     log.info("[%s] Checking for updates...", repo)
     log_to_postgres(repo, "check_start", "INFO", "Starting release check", {"first_run": is_first_run})
     
     try:
-        status, data, new_etag, resp = fetch_releases(repo, state.get("etag"))
-    except requests.HTTPError as e:
+        fetched = await fetch_releases(repo, state["pages"])
+    except ShutdownRequested:
+        log.info("[%s] Shutdown requested - check skipped", repo)
+        return
+    except RateLimitError as e:
+        _rate_limited(repo, state, e.reset, e.retry_after)
+        return
+    except httpx.HTTPStatusError as e:
         r = e.response
-        if r is not None and r.status_code == 403 and "rate limit" in r.text.lower():
-            reset = r.headers.get("x-ratelimit-reset")
-            log.warning("Rate limit for %s. Reset header: %s", repo, reset)
-            log_to_postgres(repo, "rate_limit", "WARNING", f"Rate limit reached. Reset: {reset}", {
-                "reset_time": reset
-            })
+        if r is not None and (r.status_code == 429 or (r.status_code == 403 and "rate limit" in r.text.lower())):
+            _rate_limited(repo, state, r.headers.get("x-ratelimit-reset"), r.headers.get("retry-after"))
         else:
             log.error("HTTPError %s: %s", repo, e)
             log_to_postgres(repo, "error", "ERROR", f"HTTPError: {e}", {
-                "status_code": r.status_code if r else None,
+                "status_code": r.status_code if r is not None else None,
                 "error": str(e)
             })
         return
@@ -377,52 +914,101 @@ def process_repo(repo: str) -> None:
         log_to_postgres(repo, "error", "ERROR", f"Error fetching releases: {e}", {"error": str(e)})
         return
 
-    if status == 304:
-        log.info("[%s] 304 Not Modified - no changes detected", repo)
-        log_to_postgres(repo, "no_change", "INFO", "304 Not Modified - no changes detected", {
-            "status_code": 304
-        })
-        return
+    old_releases = state.get("releases", {})
+    old_pages = state["pages"]
+    new_pages: Dict[str, Any] = {}
+    snapshot: Dict[str, Any] = {}
+    untracked: Dict[str, Any] = {}
+    changed = False
+    switched = False
+    for index, (url, page) in enumerate(fetched):
+        old_page = old_pages.get(url) or {}
+        # GitHub may answer 200 with an unchanged body (e.g. after an ETag rotation)
+        page_hash = page["hash"] or old_page.get("hash")
+        if page_hash == old_page.get("hash"):
+            # Unchanged page: reuse its releases from the previous snapshot
+            part = {rel_id: old_releases[rel_id] for rel_id in old_page.get("ids", []) if rel_id in old_releases}
+        else:
+            try:
+                data = orjson.loads(page["body"])
+                if not isinstance(data, (list, dict)) or (isinstance(data, dict) and "id" not in data):
+                    raise ValueError(f"unexpected response: {page['body'][:200]!r}")
+                part = build_snapshot(data, INCLUDE_DRAFT, INCLUDE_PRERELEASE, _asset_allowed)
+            except Exception as e:
+                # e.g. an HTML page from a proxy or a misconfigured GITHUB_API_BASE
+                log.error("Error parsing releases %s: %s", repo, e)
+                log_to_postgres(repo, "error", "ERROR", f"Error parsing releases: {e}", {"error": str(e)})
+                return
+            changed = True
+            if index and url not in old_pages:
+                # Page checked for the first time (e.g. MAX_PAGES was raised): its unknown releases are old ones
+                untracked.update({rel_id: rel for rel_id, rel in part.items() if rel_id not in old_releases})
+            elif url not in old_pages and old_pages:
+                # Release source switched (e.g. REST <-> GraphQL, whose asset ids differ)
+                switched = True
+        snapshot.update(part)
+        new_pages[url] = {
+            "etag": page["etag"],
+            "last_modified": page["last_modified"],
+            "next": page["next"],
+            "hash": page_hash,
+            "ids": list(part),
+        }
 
-    snapshot = build_snapshot(data)
+    if not changed:
+        if all(page["status"] == 304 for _, page in fetched):
+            log.info("[%s] 304 Not Modified - no changes detected", repo)
+            log_to_postgres(repo, "no_change", "INFO", "304 Not Modified - no changes detected", {
+                "status_code": 304
+            })
+        else:
+            log.info("[%s] Response body unchanged - no changes detected", repo)
+            log_to_postgres(repo, "no_change", "INFO", "Response body unchanged - no changes detected", {
+                "status_code": 200
+            })
+        state["pages"] = new_pages
+        _schedule_next(state, changed=False)
+        # Losing a newer ETag only costs one full download, so this write can wait
+        save_state(repo, state, defer=True)
+        return
+    _schedule_next(state, changed=True)
     
     # Log old vs new state
-    old_releases = state.get("releases", {})
     log.info("[%s] Old state: %d release(s), New state: %d release(s)", 
              repo, len(old_releases), len(snapshot))
     
-    # Log release details for comparison
-    for rel_id, rel in snapshot.items():
-        old_rel = old_releases.get(rel_id)
-        tag = rel.get("tag_name", "unknown")
-        asset_count = len(rel.get("assets", {}))
+    # Log release details for comparison (skipped entirely when INFO is disabled)
+    if log.isEnabledFor(logging.INFO):
+        for rel_id, rel in snapshot.items():
+            old_rel = old_releases.get(rel_id)
+            assets = rel["meta"]["assets"]
+            tag = rel["meta"].get("tag_name", "unknown")
+            asset_count = len(rel["dl"])
         
-        if old_rel:
-            # Existing release - check for changes
-            old_asset_count = len(old_rel.get("assets", {}))
-            if asset_count != old_asset_count:
-                log.info("[%s] Release %s: assets changed (%d → %d)", 
-                         repo, tag, old_asset_count, asset_count)
+            if old_rel:
+                # Existing release - check for changes
+                old_asset_count = len(old_rel["dl"])
+                if asset_count != old_asset_count:
+                    log.info("[%s] Release %s: assets changed (%d → %d)", 
+                             repo, tag, old_asset_count, asset_count)
             
-            # Log download count changes
-            for asset_id, asset in rel.get("assets", {}).items():
-                old_asset = old_rel.get("assets", {}).get(asset_id)
-                if old_asset:
-                    old_dl = old_asset.get("download_count", 0)
-                    new_dl = asset.get("download_count", 0)
-                    if new_dl != old_dl:
-                        log.info("[%s] Release %s: Asset '%s' downloads: %d → %d (+%d)", 
-                                 repo, tag, asset.get("name"), old_dl, new_dl, new_dl - old_dl)
-                else:
-                    log.info("[%s] Release %s: New asset '%s' with %d downloads", 
-                             repo, tag, asset.get("name"), asset.get("download_count", 0))
-        else:
-            # New release
-            log.info("[%s] New release detected: %s with %d asset(s)", 
-                     repo, tag, asset_count)
-            for asset_id, asset in rel.get("assets", {}).items():
-                log.info("[%s]   - Asset: '%s' (%d downloads)", 
-                         repo, asset.get("name"), asset.get("download_count", 0))
+                # Log download count changes
+                for asset_id, new_dl in rel["dl"].items():
+                    old_dl = old_rel["dl"].get(asset_id)
+                    if old_dl is not None:
+                        if new_dl != old_dl:
+                            log.info("[%s] Release %s: Asset '%s' downloads: %d → %d (+%d)", 
+                                     repo, tag, assets[asset_id]["name"], old_dl, new_dl, new_dl - old_dl)
+                    else:
+                        log.info("[%s] Release %s: New asset '%s' with %d downloads", 
+                                 repo, tag, assets[asset_id]["name"], new_dl)
+            else:
+                # New release
+                log.info("[%s] New release detected: %s with %d asset(s)", 
+                         repo, tag, asset_count)
+                for asset_id, new_dl in rel["dl"].items():
+                    log.info("[%s]   - Asset: '%s' (%d downloads)", 
+                             repo, assets[asset_id]["name"], new_dl)
     
     # On first start: Either skip all releases or report all
     if is_first_run and SKIP_EXISTING_ON_INIT:
@@ -432,12 +1018,29 @@ def process_repo(repo: str) -> None:
             "release_count": len(snapshot),
             "skip_notifications": True
         })
-        state["etag"] = new_etag
+        state["pages"] = new_pages
         state["releases"] = snapshot
         save_state(repo, state)
         return
     
-    events = detect_changes(state, snapshot)
+    if switched:
+        log.info("[%s] Release source changed: %d release(s) taken as the new baseline (no notifications)", 
+                 repo, len(snapshot))
+        log_to_postgres(repo, "source_changed", "INFO", "Release source changed, snapshot taken as new baseline", {
+            "release_count": len(snapshot)
+        })
+        state["pages"] = new_pages
+        state["releases"] = snapshot
+        save_state(repo, state)
+        return
+    
+    known = state
+    if untracked and SKIP_EXISTING_ON_INIT:
+        log.info("[%s] %d release(s) on newly checked pages marked as known (no notifications)", 
+                 repo, len(untracked))
+        known = {"releases": {**old_releases, **untracked}}
+
+    events = detect_changes(known, snapshot, DETECTORS)
     log.info("[%s] Detected %d event(s) to notify", repo, len(events))
     log_to_postgres(repo, "check", "INFO", f"Detected {len(events)} event(s)", {
         "old_releases": len(old_releases),
@@ -448,64 +1051,138 @@ def process_repo(repo: str) -> None:
     if not events:
         log.info("[%s] No notification events generated", repo)
     else:
+        queue = DiscordQueue(repo)
         for ev in events:
             log.info("[%s] Event: %s", repo, ev["type"])
             
-            # Log to PostgreSQL
-            event_data = {
-                "type": ev["type"],
-                "release": {
-                    "tag": ev["release"].get("tag_name"),
-                    "name": ev["release"].get("name"),
-                    "url": ev["release"].get("html_url")
+            # Log to PostgreSQL (only build the row when DB logging is enabled)
+            if pg_conn:
+                event_data = {
+                    "type": ev["type"],
+                    "release": {
+                        "tag": ev["release"].get("tag_name"),
+                        "name": ev["release"].get("name"),
+                        "url": ev["release"].get("html_url")
+                    }
                 }
-            }
-            if "asset" in ev:
-                event_data["asset"] = {
-                    "name": ev["asset"].get("name"),
-                    "download_count": ev["asset"].get("download_count")
-                }
-            if "delta" in ev:
-                event_data["delta"] = ev["delta"]
-                event_data["from"] = ev["from"]
-                event_data["to"] = ev["to"]
-            
-            log_to_postgres(repo, ev["type"], "INFO", f"Event: {ev['type']}", event_data)
-            
-            try:
-                format_and_send_event(repo, ev)
-            except Exception as ex:
-                log.error("Discord error (%s): %s", repo, ex)
-                log_to_postgres(repo, "error", "ERROR", f"Discord error: {ex}", {"error": str(ex)})
+                if "asset" in ev:
+                    event_data["asset"] = {
+                        "name": ev["asset"].get("name"),
+                        "download_count": ev["asset"].get("download_count")
+                    }
+                if "delta" in ev:
+                    event_data["delta"] = ev["delta"]
+                    event_data["from"] = ev["from"]
+                    event_data["to"] = ev["to"]
+                
+                log_to_postgres(repo, ev["type"], "INFO", f"Event: {ev['type']}", event_data)
+            queue.add(*build_payload(repo, ev))
+
+        await queue.flush()
 
-    state["etag"] = new_etag
+    state["pages"] = new_pages
     state["releases"] = snapshot
     save_state(repo, state)
 
+async def _cycle() -> None:
+    await asyncio.gather(*(process_repo(repo) for repo in REPOS))
+
+_webhook_tasks: Set[asyncio.Task] = set()
+
+async def _start_webhook_server() -> Any:
+    """Listen for GitHub release webhooks and check the affected repo right away"""
+    from aiohttp import web
+
+    repos = {r.lower(): r for r in REPOS}
+    secret = WEBHOOK_SECRET.encode()
+
+    async def handle(request: "web.Request") -> "web.Response":
+        body = await request.read()
+        expected = "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest()
+        # Compare bytes: compare_digest rejects str with non-ASCII characters
+        signature = request.headers.get("X-Hub-Signature-256", "").encode(errors="replace")
+        if not hmac.compare_digest(signature, expected.encode()):
+            log.warning("Webhook with invalid signature from %s", request.remote)
+            return web.Response(status=401)
+        if request.headers.get("X-GitHub-Event") != "release":
+            return web.Response(status=204)
+        try:
+            if request.content_type == "application/x-www-form-urlencoded":
+                # GitHub's default content type: the JSON is in the "payload" form field
+                payload = orjson.loads(parse_qs(body.decode()).get("payload", [""])[0])
+            else:
+                payload = orjson.loads(body)
+        except (orjson.JSONDecodeError, UnicodeDecodeError):
+            log.warning("Webhook body is not JSON - set the webhook content type to application/json")
+            return web.Response(status=400)
+        if not isinstance(payload, dict):
+            return web.Response(status=400)
+        repo = repos.get(((payload.get("repository") or {}).get("full_name") or "").lower())
+        if not repo:
+            return web.Response(status=204)
+        log.info("[%s] Webhook: release %s", repo, payload.get("action"))
+        task = asyncio.create_task(process_repo(repo, force=True))
+        _webhook_tasks.add(task)
+        task.add_done_callback(_webhook_tasks.discard)
+        return web.Response(status=202)
+
+    app = web.Application()
+    app.router.add_post("/", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, port=WEBHOOK_LISTEN_PORT).start()
+    log.info("Listening for GitHub webhooks on port %d", WEBHOOK_LISTEN_PORT)
+    return runner
+
+async def _run() -> None:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, _sig_handler)
+        except NotImplementedError:
+            # Windows event loops have no add_signal_handler
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(_sig_handler))
+    runner = None
+    if WEBHOOK_LISTEN_PORT:
+        if not WEBHOOK_SECRET:
+            log.warning("WEBHOOK_LISTEN_PORT is set without WEBHOOK_SECRET - webhook listener disabled")
+        else:
+            try:
+                runner = await _start_webhook_server()
+            except ImportError as e:
+                log.warning("aiohttp not available (webhook listener disabled): %s", e)
+    try:
+        # Run once for all repos
+        await _cycle()
+
+        # If POLL_INTERVAL > 0, continue in loop (for Docker/local continuous monitoring)
+        if POLL_INTERVAL > 0:
+            log.info("Entering continuous monitoring mode (POLL_INTERVAL=%d)", POLL_INTERVAL)
+            while not _shutdown_evt.is_set():
+                await _cycle()
+                try:
+                    await asyncio.wait_for(_shutdown_evt.wait(), POLL_INTERVAL)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+        elif runner:
+            log.info("Single run completed (POLL_INTERVAL=0), waiting for webhooks")
+            await _shutdown_evt.wait()
+        else:
+            log.info("Single run completed (POLL_INTERVAL=0)")
+    finally:
+        if runner:
+            await runner.cleanup()
+            await asyncio.gather(*_webhook_tasks, return_exceptions=True)
+        flush_states()
+        _pg_flush()
+        await GITHUB_SESSION.aclose()
+        await SESSION.aclose()
+
 def main_loop():
     if not REPOS:
         raise SystemExit("Please set REPOS='owner/repo,owner2/repo2'.")
-    
-    # Run once for each repo
-    for repo in REPOS:
-        if shutdown:
-            break
-        process_repo(repo)
-    
-    # If POLL_INTERVAL > 0, continue in loop (for Docker/local continuous monitoring)
-    if POLL_INTERVAL > 0:
-        log.info("Entering continuous monitoring mode (POLL_INTERVAL=%d)", POLL_INTERVAL)
-        while not shutdown:
-            for repo in REPOS:
-                if shutdown:
-                    break
-                process_repo(repo)
-            slept = 0
-            while not shutdown and slept < POLL_INTERVAL:
-                time.sleep(1)
-                slept += 1
-    else:
-        log.info("Single run completed (POLL_INTERVAL=0)")
+    asyncio.run(_run())
 
 if __name__ == "__main__":
-    main_loop()
\ No newline at end of file
+    main_loop()
@@ -0,0 +1,139 @@
+"""Snapshot building and diffing for gh-watcher.
+
+Kept free of module-level configuration and fully annotated, so it can be
+compiled with mypyc (`mypyc diff.py`). bot.py imports the compiled extension
+when it exists and this file otherwise.
+"""
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+AssetMeta = Dict[str, Dict[str, Any]]
+
+def _all_assets(assets: List[Dict[str, Any]]) -> Tuple[AssetMeta, Dict[str, int]]:
+    """Asset metadata and download counts when no asset filters are set"""
+    asset_meta: AssetMeta = {}
+    dl: Dict[str, int] = {}
+    for a in assets:
+        asset_id = str(a["id"])
+        asset_meta[asset_id] = {
+            "name": a.get("name") or "",
+            "browser_download_url": a.get("browser_download_url"),
+        }
+        dl[asset_id] = int(a.get("download_count", 0))
+    return asset_meta, dl
+
+def _filtered_assets(assets: List[Dict[str, Any]],
+                     asset_allowed: Callable[[str], Any]) -> Tuple[AssetMeta, Dict[str, int]]:
+    """Asset metadata and download counts of the assets passing the name filters"""
+    asset_meta: AssetMeta = {}
+    dl: Dict[str, int] = {}
+    for a in assets:
+        name: str = a.get("name") or ""
+        if not asset_allowed(name):
+            continue
+        asset_id = str(a["id"])
+        asset_meta[asset_id] = {
+            "name": name,
+            "browser_download_url": a.get("browser_download_url"),
+        }
+        dl[asset_id] = int(a.get("download_count", 0))
+    return asset_meta, dl
+
+def summarize_release(rel: Dict[str, Any], asset_allowed: Optional[Callable[[str], Any]]) -> Dict[str, Any]:
+    """Split a release into slowly changing metadata and its download counts"""
+    assets: List[Dict[str, Any]] = rel.get("assets", []) or []
+    # asset_allowed is None without asset filters: skip the per-asset call entirely
+    if asset_allowed is None:
+        asset_meta, dl = _all_assets(assets)
+    else:
+        asset_meta, dl = _filtered_assets(assets, asset_allowed)
+    return {
+        "meta": {
+            "tag_name": rel.get("tag_name"),
+            "name": rel.get("name"),
+            "draft": rel.get("draft"),
+            "prerelease": rel.get("prerelease"),
+            "html_url": rel.get("html_url"),
+            "published_at": rel.get("published_at"),
+            "assets": asset_meta,
+        },
+        "dl": dl,
+    }
+
+def build_snapshot(api_data: Any, include_draft: bool, include_prerelease: bool,
+                   asset_allowed: Optional[Callable[[str], Any]]) -> Dict[str, Any]:
+    rels: List[Dict[str, Any]]
+    if isinstance(api_data, dict) and "id" in api_data:
+        rels = [api_data]
+    else:
+        rels = api_data or []
+    snapshot: Dict[str, Any] = {}
+    for rel in rels:
+        if not include_draft and rel.get("draft"):
+            continue
+        if not include_prerelease and rel.get("prerelease"):
+            continue
+        snapshot[str(rel.get("id"))] = summarize_release(rel, asset_allowed)
+    return snapshot
+
+def _asset(rel: Dict[str, Any], asset_id: str) -> Dict[str, Any]:
+    """Asset details for an event, joined with its current download count"""
+    return {**rel["meta"]["assets"][asset_id], "download_count": rel["dl"][asset_id]}
+
+DlMap = Dict[Tuple[str, str], int]
+Detector = Callable[[Dict[str, Any], Set[str], DlMap, DlMap], List[Dict[str, Any]]]
+
+def _detect_new_release(new: Dict[str, Any], new_rel_ids: Set[str], old_dl: DlMap, new_dl: DlMap) -> List[Dict[str, Any]]:
+    return [{"type": "new_release", "release": rel["meta"]} for rel_id, rel in new.items() if rel_id in new_rel_ids]
+
+def _detect_new_asset(new: Dict[str, Any], new_rel_ids: Set[str], old_dl: DlMap, new_dl: DlMap) -> List[Dict[str, Any]]:
+    # Only assets added to already known releases
+    return [
+        {"type": "new_asset", "release": new[rel_id]["meta"], "asset": _asset(new[rel_id], asset_id)}
+        for (rel_id, asset_id) in new_dl
+        if (rel_id, asset_id) not in old_dl and rel_id not in new_rel_ids
+    ]
+
+def _detect_dl_increase(new: Dict[str, Any], new_rel_ids: Set[str], old_dl: DlMap, new_dl: DlMap) -> List[Dict[str, Any]]:
+    events: List[Dict[str, Any]] = []
+    for key, to_dl in new_dl.items():
+        # Old download count is 0 if asset or release is new
+        from_dl = old_dl.get(key, 0)
+        if to_dl > from_dl:
+            rel = new[key[0]]
+            events.append({
+                "type": "dl_increase",
+                "release": rel["meta"],
+                "asset": _asset(rel, key[1]),
+                "delta": to_dl - from_dl,
+                "from": from_dl,
+                "to": to_dl
+            })
+    return events
+
+# Event type -> detector, in the order events are reported
+DETECTORS: Dict[str, Detector] = {
+    "new_release": _detect_new_release,
+    "new_asset": _detect_new_asset,
+    "dl_increase": _detect_dl_increase,
+}
+
+def select_detectors(notify_on: Set[str]) -> List[Detector]:
+    """Detectors for the enabled event types; built once instead of checking NOTIFY_ON per call"""
+    return [fn for name, fn in DETECTORS.items() if name in notify_on]
+
+def detect_changes(old: Dict[str, Any], new: Dict[str, Any], detectors: List[Detector]) -> List[Dict[str, Any]]:
+    events: List[Dict[str, Any]] = []
+    old_rels: Dict[str, Any] = old.get("releases", {})
+    new_rel_ids: Set[str] = set(new.keys() - old_rels.keys())
+
+    # Flat (release id, asset id) -> download count maps; only the small dl maps are touched
+    old_dl: DlMap = {
+        (rel_id, asset_id): count for rel_id, rel in old_rels.items() for asset_id, count in rel["dl"].items()
+    }
+    new_dl: DlMap = {
+        (rel_id, asset_id): count for rel_id, rel in new.items() for asset_id, count in rel["dl"].items()
+    }
+
+    for detect in detectors:
+        events += detect(new, new_rel_ids, old_dl, new_dl)
+    return events